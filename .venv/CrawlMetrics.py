@@ -0,0 +1,146 @@
+import os
+import json
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+# Куда сохранять метрики по окончании обхода (пусто — не сохранять)
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH", "")
+METRICS_PROMETHEUS_PATH = os.getenv("METRICS_PROMETHEUS_PATH", "")
+# Сколько последних замеров хранится на этап для расчёта перцентилей
+METRICS_SAMPLES = int(os.getenv("METRICS_SAMPLES", "10000"))
+
+
+def _percentile(samples, percent: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class StageStats:
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(_percentile(self.samples, 50) * 1000, 3),
+            "p95_ms": round(_percentile(self.samples, 95) * 1000, 3),
+            "p99_ms": round(_percentile(self.samples, 99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class CrawlMetrics:
+    """
+    Счётчики и длительности этапов обхода. Хуки трассировки (hooks) вызываются
+    на каждый замер как hook(stage, seconds, attrs).
+    """
+
+    def __init__(self, max_samples: int = METRICS_SAMPLES):
+        self.max_samples = max_samples
+        self.hooks = []
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.counters = defaultdict(int)
+        self.stages = defaultdict(lambda: StageStats(self.max_samples))
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def incr(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def observe(self, stage: str, seconds: float, **attrs):
+        self.stages[stage].observe(seconds)
+        for hook in self.hooks:
+            hook(stage, seconds, attrs)
+
+    @contextmanager
+    def timer(self, stage: str, **attrs):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, **attrs)
+
+    def record_request(self, kind: str, status, seconds: float):
+        self.incr("requests_total")
+        self.incr(f"{kind}_requests_total")
+        self.incr(f"status_{status if status is not None else 'error'}")
+        self.observe(f"{kind}_request", seconds, status=status)
+
+    def to_dict(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests_per_second": round(self.counters.get("requests_total", 0) / elapsed, 3) if elapsed else 0.0,
+            "counters": dict(self.counters),
+            "stages": {stage: stats.to_dict() for stage, stats in self.stages.items()},
+        }
+
+    def summary(self) -> str:
+        data = self.to_dict()
+        requests = self.counters.get("requests_total", 0)
+        blocked = self.counters.get("status_403", 0) + self.counters.get("status_429", 0)
+        lines = [
+            f"Время обхода: {data['elapsed_seconds']:.1f} с, запросов: {requests} "
+            f"({data['requests_per_second']:.2f} запр/с)",
+            f"Повторы: {self.counters.get('retries_total', 0)}, блокировки 403/429: {blocked} "
+            f"({blocked / requests:.1%})" if requests else "Запросов не было",
+        ]
+        for stage, stats in sorted(data["stages"].items()):
+            lines.append(f"  {stage:20} n={stats['count']:<7} p50={stats['p50_ms']:9.2f} мс  "
+                         f"p95={stats['p95_ms']:9.2f} мс  p99={stats['p99_ms']:9.2f} мс  "
+                         f"всего={stats['total_seconds']:8.2f} с")
+        other = {name: value for name, value in sorted(self.counters.items())
+                 if not name.startswith("status_") and name not in ("requests_total", "retries_total")}
+        if other:
+            lines.append("  " + ", ".join(f"{name}={value}" for name, value in other.items()))
+        return "\n".join(lines)
+
+    def dump_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+
+    def dump_prometheus(self, path: str):
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE adidas_scraper_{name} counter")
+            lines.append(f"adidas_scraper_{name} {value}")
+        lines.append("# TYPE adidas_scraper_stage_seconds summary")
+        for stage, stats in sorted(self.stages.items()):
+            for quantile in (50, 95, 99):
+                lines.append(f'adidas_scraper_stage_seconds{{stage="{stage}",quantile="{quantile / 100}"}} '
+                             f"{_percentile(stats.samples, quantile):.6f}")
+            lines.append(f'adidas_scraper_stage_seconds_sum{{stage="{stage}"}} {stats.total:.6f}')
+            lines.append(f'adidas_scraper_stage_seconds_count{{stage="{stage}"}} {stats.count}')
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+
+    def report(self, json_path: str = METRICS_JSON_PATH, prometheus_path: str = METRICS_PROMETHEUS_PATH):
+        print(self.summary())
+        if json_path:
+            self.dump_json(json_path)
+        if prometheus_path:
+            self.dump_prometheus(prometheus_path)
+
+
+# Общий экземпляр на процесс
+metrics = CrawlMetrics()
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from DatabaseManager import AsyncDatabaseManager, INSERT_BATCH_SIZE
+from CrawlMetrics import metrics
+
+
+# Параметры конвейера обхода
+PIPELINE_LISTING_WORKERS = int(os.getenv("PIPELINE_LISTING_WORKERS", "4"))
+PIPELINE_DETAIL_WORKERS = int(os.getenv("PIPELINE_DETAIL_WORKERS", "16"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "500"))
+PIPELINE_FLUSH_INTERVAL = float(os.getenv("PIPELINE_FLUSH_INTERVAL", "5"))
+# Сколько часов данные товара считаются свежими (0 — всегда перезапрашивать)
+FETCH_STATE_TTL_HOURS = float(os.getenv("FETCH_STATE_TTL_HOURS", "24"))
+
+# Маркер ответа 304 Not Modified
+NOT_MODIFIED = object()
+
+
+def content_hash(record: dict) -> str:
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CrawlPipeline:
+    """
+    Конвейер обхода: страницы каталога -> очередь product_id -> пул загрузчиков
+    JSON -> очередь записей -> пакетная запись в базу (по размеру пакета или по времени).
+    Ограниченные очереди дают обратное давление, поэтому память не растёт с размером каталога.
+    """
+
+    def __init__(self, scraper, db_manager: AsyncDatabaseManager,
+                 listing_workers: int = PIPELINE_LISTING_WORKERS,
+                 detail_workers: int = PIPELINE_DETAIL_WORKERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 batch_size: int = INSERT_BATCH_SIZE,
+                 flush_interval: float = PIPELINE_FLUSH_INTERVAL,
+                 incremental: bool = True,
+                 ttl_hours: float = FETCH_STATE_TTL_HOURS):
+        self.scraper = scraper
+        self.db_manager = db_manager
+        self.listing_workers = listing_workers
+        self.detail_workers = detail_workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.incremental = incremental
+        self.ttl = timedelta(hours=ttl_hours)
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+
+    async def run_category(self, base_url: str):
+        num_pages = await self.scraper.pages(base_url)
+        urls = [base_url] + [f"{base_url}?start={i * 48}" for i in range(1, num_pages)]
+        return await self.run(urls=urls)
+
+    async def run_products(self, products: dict):
+        return await self.run(products=products.values())
+
+    async def run(self, urls=(), products=()):
+        self.inserted, self.updated, self.skipped = 0, 0, 0
+        started = time.monotonic()
+
+        url_queue = asyncio.Queue()
+        product_queue = asyncio.Queue(maxsize=self.queue_size)
+        record_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        for url in urls:
+            url_queue.put_nowait(url)
+        for _ in range(self.listing_workers):
+            url_queue.put_nowait(None)
+
+        writer = asyncio.create_task(self._writer(record_queue))
+        details = [asyncio.create_task(self._detail_worker(product_queue, record_queue))
+                   for _ in range(self.detail_workers)]
+        listings = [asyncio.create_task(self._listing_worker(url_queue, product_queue))
+                    for _ in range(self.listing_workers)]
+
+        products = list(products)
+
+        async def drive():
+            for start in range(0, len(products), self.queue_size):
+                await self._enqueue_products(products[start:start + self.queue_size], product_queue)
+            await asyncio.gather(*listings)
+            for _ in details:
+                await product_queue.put(None)
+            await asyncio.gather(*details)
+            await record_queue.put(None)
+
+        driver = asyncio.create_task(drive())
+        tasks = listings + details + [driver, writer]
+        try:
+            # Писатель отслеживается наравне с остальными этапами: если он упадёт,
+            # очередь записей переполнится и загрузчики зависнут на put()
+            await asyncio.wait([driver, writer], return_when=asyncio.FIRST_EXCEPTION)
+            for task in (writer, driver):
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        elapsed = time.monotonic() - started
+        metrics.incr("products_unchanged_total", self.skipped)
+        print(f"Обход завершён за {elapsed:.1f} с: добавлено {self.inserted}, обновлено {self.updated}, "
+              f"без изменений {self.skipped} "
+              f"({(self.inserted + self.updated) / max(elapsed, 1e-6):.1f} строк/с)")
+        return self.inserted, self.updated
+
+    async def _listing_worker(self, url_queue: asyncio.Queue, product_queue: asyncio.Queue):
+        while True:
+            url = await url_queue.get()
+            if url is None:
+                return
+            try:
+                products = await self.scraper.scrape_product_ids(url)
+            except Exception as e:
+                print(f"Ошибка обработки страницы {url}: {e}")
+                continue
+            await self._enqueue_products(list(products.values()), product_queue)
+
+    async def _enqueue_products(self, records: list, product_queue: asyncio.Queue):
+        # Состояние загрузки запрашивается одним запросом на страницу каталога
+        states = {}
+        if self.incremental and records:
+            states = await self.db_manager.get_fetch_state(record['product_id'] for record in records)
+        for record in records:
+            await product_queue.put((record, states.get(record['product_id'])))
+
+    def _is_fresh(self, state: dict) -> bool:
+        return (state is not None and state.get('content_hash') is not None
+                and datetime.now(timezone.utc) - state['fetched_at'] < self.ttl)
+
+    async def _detail_worker(self, product_queue: asyncio.Queue, record_queue: asyncio.Queue):
+        while True:
+            item = await product_queue.get()
+            if item is None:
+                return
+            record, state = item
+            product_id = record['product_id']
+            metrics.incr("products_total")
+            if self.incremental and self._is_fresh(state):
+                self.skipped += 1
+                continue
+            try:
+                response, validators = await self.scraper.fetch_adidas_data_conditional(
+                    product_id, state if self.incremental else None
+                )
+                if response is NOT_MODIFIED:
+                    self.skipped += 1
+                    await record_queue.put((None, {'key': product_id, **validators}))
+                    continue
+                if response and "id" in response:
+                    record.update(await self.scraper.parse_adidas_json(response))
+                    new_state = {'key': product_id, 'content_hash': content_hash(record), **validators}
+                    if state is not None and state.get('content_hash') == new_state['content_hash']:
+                        # Данные не изменились — обновляем только время загрузки
+                        self.skipped += 1
+                        await record_queue.put((None, new_state))
+                        continue
+                    await record_queue.put((record, new_state))
+                    continue
+            except Exception as e:
+                print(f"Ошибка обработки товара {product_id}: {e}")
+            # Запись сохраняется даже без подробностей, как и раньше
+            await record_queue.put((record, None))
+
+    async def _writer(self, record_queue: asyncio.Queue):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = await asyncio.wait_for(record_queue.get(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            else:
+                if item is None:
+                    await self._flush(batch)
+                    return
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                await self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    async def _flush(self, batch: list):
+        if not batch:
+            return
+        records = [record for record, _ in batch if record is not None]
+        if records:
+            # Состояние (хеш, время загрузки) сохраняется только вместе с успешно записанной строкой,
+            # иначе при следующем обходе товар посчитался бы свежим и так и не попал бы в базу
+            fetch_states = {record['product_id']: state for record, state in batch
+                            if record is not None and state is not None} if self.incremental else None
+            inserted, updated = await self.db_manager.insert_data(
+                records, batch_size=self.batch_size, fetch_states=fetch_states
+            )
+            self.inserted += inserted
+            self.updated += updated
+        if self.incremental:
+            # Товары без изменений: в базе уже лежат те же данные, обновляем только время загрузки
+            await self.db_manager.save_fetch_state(state for record, state in batch
+                                                   if record is None and state is not None)
@@ -0,0 +1,522 @@
+import os
+import asyncpg
+from dotenv import load_dotenv
+from ExportEngine import ExportEngine
+from CrawlMetrics import metrics
+import psycopg2
+
+load_dotenv("parcer.env")
+
+# Получение значений переменных среды
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_NAME = os.getenv("DB_NAME")
+
+# Размер пакета для массовой вставки
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "500"))
+
+PRODUCT_COLUMNS = [
+    'product_id', 'brand', 'category', 'model_name', 'color', 'price', 'discount',
+    'image_side_url', 'image_top_url', 'image_34_url', 'gender'
+]
+
+STAGING_TABLE = "adidas_products_staging"
+
+# Слияние временной таблицы с основной. Дубли товара внутри пакета сводятся так же,
+# как их применяли бы построчные upsert по порядку: в каждой колонке побеждает
+# последнее непустое значение (по ordinal). Существующая строка обновляется (и получает новый
+# updated_at), только если хотя бы одна колонка действительно меняется; нетронутые строки
+# не возвращаются из RETURNING, а (xmax = 0) отличает вставленные строки от обновлённых.
+LAST_NON_NULL_COLUMNS = ",\n           ".join(
+    f"(array_agg({column} ORDER BY ordinal DESC) FILTER (WHERE {column} IS NOT NULL))[1]"
+    for column in PRODUCT_COLUMNS[1:]
+)
+CHANGED_COLUMNS_CONDITION = "\n       OR ".join(
+    f"COALESCE(EXCLUDED.{column}, adidas_products.{column}) IS DISTINCT FROM adidas_products.{column}"
+    for column in PRODUCT_COLUMNS[1:]
+)
+
+MERGE_STAGING_SQL = f"""
+    INSERT INTO adidas_products ({', '.join(PRODUCT_COLUMNS)})
+    SELECT product_id,
+           {LAST_NON_NULL_COLUMNS}
+    FROM {STAGING_TABLE}
+    WHERE product_id IS NOT NULL
+    GROUP BY product_id
+    ON CONFLICT (product_id) DO UPDATE
+    SET brand = COALESCE(EXCLUDED.brand, adidas_products.brand),
+        category = COALESCE(EXCLUDED.category, adidas_products.category),
+        model_name = COALESCE(EXCLUDED.model_name, adidas_products.model_name),
+        color = COALESCE(EXCLUDED.color, adidas_products.color),
+        price = COALESCE(EXCLUDED.price, adidas_products.price),
+        discount = COALESCE(EXCLUDED.discount, adidas_products.discount),
+        image_side_url = COALESCE(EXCLUDED.image_side_url, adidas_products.image_side_url),
+        image_top_url = COALESCE(EXCLUDED.image_top_url, adidas_products.image_top_url),
+        image_34_url = COALESCE(EXCLUDED.image_34_url, adidas_products.image_34_url),
+        gender = COALESCE(EXCLUDED.gender, adidas_products.gender),
+        updated_at = now()
+    WHERE {CHANGED_COLUMNS_CONDITION}
+    RETURNING (xmax = 0) AS inserted
+"""
+
+# Снимок цены добавляется, только если цена отличается от последней записанной
+PRICE_HISTORY_SQL = f"""
+    INSERT INTO adidas_price_history (product_id, price, sale_price, category, gender)
+    SELECT p.product_id, p.price, p.sale_price, p.category, p.gender
+    FROM (
+        SELECT product_id, category, gender,
+               CASE WHEN price ~ '^[0-9]+(\\.[0-9]+)?$' THEN price::numeric END AS price,
+               CASE WHEN discount ~ '^[0-9]+(\\.[0-9]+)?$' THEN discount::numeric END AS sale_price
+        FROM adidas_products
+        WHERE product_id IN (SELECT product_id FROM {STAGING_TABLE})
+    ) p
+    LEFT JOIN LATERAL (
+        SELECT h.price, h.sale_price
+        FROM adidas_price_history h
+        WHERE h.product_id = p.product_id
+        ORDER BY h.ts DESC
+        LIMIT 1
+    ) last ON true
+    WHERE p.price IS NOT NULL
+      AND (last.price IS DISTINCT FROM p.price OR last.sale_price IS DISTINCT FROM p.sale_price)
+"""
+
+
+def empty_product(product_id):
+    return {
+        'brand': None,
+        'category': None,
+        'model_name': None,
+        'color': None,
+        'price': None,
+        'discount': None,
+        'product_id': product_id,
+        'image_side_url': None,
+        'image_top_url': None,
+        'image_34_url': None,
+        'gender': None
+    }
+
+
+def _to_text(value):
+    return None if value is None else str(value)
+
+class AsyncDatabaseManager:
+    def __init__(self):
+        self.pool = None
+
+    async def connect_to_database(self, min_size: int = 10, max_size: int = 10):
+        try:
+            self.pool = await asyncpg.create_pool(
+                user=DB_USER,
+                password=DB_PASSWORD,
+                database=DB_NAME,
+                host=DB_HOST,
+                port=DB_PORT,
+                min_size=min_size,
+                max_size=max_size
+            )
+            print("Соединение с базой данных установлено")
+        except asyncpg.exceptions.PostgresError as e:
+            print("Не удалось подключиться к базе данных")
+            print(e)
+
+    async def create_table(self):
+        try:
+            async with self.pool.acquire() as connection:
+                await connection.execute("""
+                    CREATE TABLE IF NOT EXISTS adidas_products (
+                        product_id TEXT PRIMARY KEY,
+                        brand TEXT,
+                        category TEXT,
+                        model_name TEXT,
+                        color TEXT,
+                        price TEXT,
+                        discount TEXT,
+                        image_side_url TEXT, 
+                        image_top_url TEXT, 
+                        image_34_url TEXT, 
+                        gender TEXT,
+                        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                    )
+                """)
+                await connection.execute("""
+                    ALTER TABLE adidas_products ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                """)
+                await connection.execute("""
+                    CREATE TABLE IF NOT EXISTS adidas_fetch_state (
+                        key TEXT PRIMARY KEY,
+                        etag TEXT,
+                        last_modified TEXT,
+                        content_hash TEXT,
+                        fetched_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                    )
+                """)
+                await connection.execute("""
+                    CREATE TABLE IF NOT EXISTS adidas_price_history (
+                        id BIGSERIAL PRIMARY KEY,
+                        product_id TEXT NOT NULL,
+                        ts TIMESTAMPTZ NOT NULL DEFAULT now(),
+                        price NUMERIC(12, 2),
+                        sale_price NUMERIC(12, 2),
+                        category TEXT,
+                        gender TEXT
+                    )
+                """)
+                await connection.execute("""
+                    CREATE INDEX IF NOT EXISTS adidas_price_history_product_ts_idx
+                    ON adidas_price_history (product_id, ts DESC)
+                """)
+                await connection.execute("""
+                    CREATE INDEX IF NOT EXISTS adidas_price_history_category_gender_idx
+                    ON adidas_price_history (category, gender, ts)
+                """)
+                # Для выборок по времени без фильтра категории (снижения цен за период)
+                await connection.execute("""
+                    CREATE INDEX IF NOT EXISTS adidas_price_history_ts_idx
+                    ON adidas_price_history (ts, product_id)
+                """)
+                await connection.execute("""
+                    CREATE TABLE IF NOT EXISTS adidas_crawl_work (
+                        work_id BIGSERIAL PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        site_path TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        lease_owner TEXT,
+                        lease_expires_at TIMESTAMPTZ,
+                        finished_at TIMESTAMPTZ,
+                        UNIQUE (kind, payload, site_path)
+                    )
+                """)
+                await connection.execute("""
+                    CREATE INDEX IF NOT EXISTS adidas_crawl_work_open_idx
+                    ON adidas_crawl_work (status, lease_expires_at) WHERE status IN ('pending', 'leased')
+                """)
+            print("Таблица успешно создана")
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка создания таблицы")
+            print(e)
+
+    async def insert_data(self, data, batch_size: int = INSERT_BATCH_SIZE, use_copy: bool = True,
+                          fetch_states: dict = None):
+        """
+        Пакетная вставка: строки заливаются во временную таблицу (COPY или executemany),
+        затем одним запросом сливаются в adidas_products с прежней семантикой COALESCE.
+        fetch_states (product_id -> состояние загрузки) сохраняются в той же транзакции,
+        что и сами строки. Возвращает кортеж (inserted, updated); ошибки записи пробрасываются.
+        """
+        records = [
+            (
+                item['product_id'], item['brand'], item['category'], item['model_name'], item['color'],
+                _to_text(item['price']), _to_text(item['discount']), item['image_side_url'], item['image_top_url'],
+                item['image_34_url'], item['gender'], ordinal
+            )
+            for ordinal, item in enumerate(data)
+        ]
+        inserted, updated = 0, 0
+        try:
+            async with self.pool.acquire() as connection:
+                for start in range(0, len(records), batch_size):
+                    batch = records[start:start + batch_size]
+                    with metrics.timer("db_write", rows=len(batch)):
+                        async with connection.transaction():
+                            await connection.execute(f"""
+                                CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE}
+                                (LIKE adidas_products INCLUDING DEFAULTS, ordinal INTEGER) ON COMMIT DELETE ROWS
+                            """)
+                            if use_copy:
+                                await connection.copy_records_to_table(
+                                    STAGING_TABLE, records=batch, columns=PRODUCT_COLUMNS + ['ordinal']
+                                )
+                            else:
+                                await connection.executemany(f"""
+                                    INSERT INTO {STAGING_TABLE} ({', '.join(PRODUCT_COLUMNS)}, ordinal)
+                                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+                                """, batch)
+                            rows = await connection.fetch(MERGE_STAGING_SQL)
+                            await connection.execute(PRICE_HISTORY_SQL)
+                            if fetch_states:
+                                await self._save_fetch_state(connection, [
+                                    fetch_states[record[0]] for record in batch if record[0] in fetch_states
+                                ])
+                    batch_inserted = sum(1 for row in rows if row['inserted'])
+                    inserted += batch_inserted
+                    updated += len(rows) - batch_inserted
+            metrics.incr("rows_inserted_total", inserted)
+            metrics.incr("rows_updated_total", updated)
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка вставки данных в базу данных")
+            print(e)
+            raise
+        return inserted, updated
+
+    async def export(self, filename, fmt=None, category=None, gender=None, changed_since=None):
+        try:
+            total = await ExportEngine(self.pool).export(
+                filename, fmt, category=category, gender=gender, changed_since=changed_since
+            )
+            print(f"Данные успешно экспортированы в файл {filename} ({total} строк)")
+        except (asyncpg.exceptions.PostgresError, ValueError, OSError) as e:
+            print("Ошибка экспорта данных")
+            print(e)
+
+    async def export_to_excel(self, filename):
+        await self.export(filename, "xlsx")
+
+    async def get_products_without_brand(self):
+        try:
+            async with self.pool.acquire() as connection:
+                product_ids = await connection.fetch("SELECT product_id FROM adidas_products WHERE brand IS NULL")
+                products = {
+                    product_id['product_id']: empty_product(product_id['product_id'])
+                    for product_id in product_ids
+                }
+                return products
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка получения продуктов без бренда")
+            print(e)
+            return {}
+
+    async def get_fetch_state(self, keys):
+        try:
+            async with self.pool.acquire() as connection:
+                records = await connection.fetch("""
+                    SELECT key, etag, last_modified, content_hash, fetched_at
+                    FROM adidas_fetch_state
+                    WHERE key = ANY($1::text[])
+                """, list(keys))
+                return {record['key']: dict(record) for record in records}
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка получения состояния загрузки")
+            print(e)
+            return {}
+
+    async def save_fetch_state(self, states):
+        """Сохраняет состояние загрузки: словари с ключами key, etag, last_modified, content_hash."""
+        try:
+            async with self.pool.acquire() as connection:
+                await self._save_fetch_state(connection, states)
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка сохранения состояния загрузки")
+            print(e)
+
+    @staticmethod
+    async def _save_fetch_state(connection, states):
+        states = list({state['key']: state for state in states}.values())
+        if not states:
+            return
+        await connection.execute("""
+            INSERT INTO adidas_fetch_state (key, etag, last_modified, content_hash, fetched_at)
+            SELECT key, etag, last_modified, content_hash, now()
+            FROM unnest($1::text[], $2::text[], $3::text[], $4::text[])
+                AS s(key, etag, last_modified, content_hash)
+            ON CONFLICT (key) DO UPDATE
+            SET etag = COALESCE(EXCLUDED.etag, adidas_fetch_state.etag),
+                last_modified = COALESCE(EXCLUDED.last_modified, adidas_fetch_state.last_modified),
+                content_hash = COALESCE(EXCLUDED.content_hash, adidas_fetch_state.content_hash),
+                fetched_at = EXCLUDED.fetched_at
+        """,
+            [state['key'] for state in states],
+            [state.get('etag') for state in states],
+            [state.get('last_modified') for state in states],
+            [state.get('content_hash') for state in states]
+        )
+
+    async def get_current_price(self, product_id):
+        try:
+            async with self.pool.acquire() as connection:
+                record = await connection.fetchrow("""
+                    SELECT product_id, price, sale_price, ts
+                    FROM adidas_price_history
+                    WHERE product_id = $1
+                    ORDER BY ts DESC
+                    LIMIT 1
+                """, product_id)
+                return dict(record) if record else None
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка получения текущей цены")
+            print(e)
+            return None
+
+    async def get_price_series(self, product_id, since=None):
+        conditions, args = ["product_id = $1"], [product_id]
+        if since is not None:
+            args.append(since)
+            conditions.append(f"ts >= ${len(args)}")
+        try:
+            async with self.pool.acquire() as connection:
+                records = await connection.fetch(f"""
+                    SELECT ts, price, sale_price
+                    FROM adidas_price_history
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY ts
+                """, *args)
+                return [dict(record) for record in records]
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка получения истории цен")
+            print(e)
+            return []
+
+    async def get_biggest_discount_drops(self, since, limit=50, category=None, gender=None):
+        """
+        Товары с наибольшим снижением фактической цены (sale_price, иначе price)
+        по сравнению с последней ценой на момент since.
+        """
+        # Условия собираются по заданным фильтрам, как в ExportEngine.build_query,
+        # чтобы планировщик видел простые предикаты и мог взять индекс
+        conditions, args = ["ts > $1"], [since]
+        if category is not None:
+            args.append(category)
+            conditions.append(f"category = ${len(args)}")
+        if gender is not None:
+            args.append(gender)
+            conditions.append(f"gender = ${len(args)}")
+        args.append(limit)
+        try:
+            async with self.pool.acquire() as connection:
+                records = await connection.fetch(f"""
+                    WITH latest AS (
+                        SELECT DISTINCT ON (product_id)
+                               product_id, category, gender, ts,
+                               COALESCE(sale_price, price) AS price_now
+                        FROM adidas_price_history
+                        WHERE {' AND '.join(conditions)}
+                        ORDER BY product_id, ts DESC
+                    )
+                    SELECT l.product_id, l.category, l.gender, l.ts,
+                           b.price_before, l.price_now,
+                           b.price_before - l.price_now AS price_drop,
+                           round((b.price_before - l.price_now) / NULLIF(b.price_before, 0) * 100, 1) AS drop_percent
+                    FROM latest l
+                    CROSS JOIN LATERAL (
+                        SELECT COALESCE(h.sale_price, h.price) AS price_before
+                        FROM adidas_price_history h
+                        WHERE h.product_id = l.product_id AND h.ts <= $1
+                        ORDER BY h.ts DESC
+                        LIMIT 1
+                    ) b
+                    WHERE l.price_now < b.price_before
+                    ORDER BY price_drop DESC
+                    LIMIT ${len(args)}
+                """, *args)
+                return [dict(record) for record in records]
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка получения снижений цен")
+            print(e)
+            return []
+
+    async def enqueue_work(self, kind, payloads, site_path):
+        """
+        Ставит задания в очередь; завершённые ранее задания с тем же ключом запускаются заново.
+        Очередь обслуживает один sitePath: товары, история цен и состояние загрузки хранятся
+        по product_id без региона, поэтому, пока в очереди есть незавершённые задания
+        для другого sitePath, новые задания отклоняются.
+        """
+        payloads = list(dict.fromkeys(payloads))
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    # Блокировка не даёт двум процессам одновременно поставить разные sitePath
+                    await connection.execute("LOCK TABLE adidas_crawl_work IN SHARE ROW EXCLUSIVE MODE")
+                    other_site_path = await connection.fetchval("""
+                        SELECT site_path FROM adidas_crawl_work
+                        WHERE site_path <> $1 AND status IN ('pending', 'leased')
+                        LIMIT 1
+                    """, site_path)
+                    if other_site_path is not None:
+                        print(f"В очереди есть незавершённые задания для sitePath {other_site_path}, "
+                              f"задания для {site_path} не поставлены. Данные разных регионов хранятся "
+                              f"по одному product_id и перезаписывали бы друг друга; сначала завершите "
+                              f"текущую очередь (пункт 5 меню)")
+                        return 0
+                    await connection.execute("""
+                        INSERT INTO adidas_crawl_work (kind, payload, site_path)
+                        SELECT $1, payload, $3 FROM unnest($2::text[]) AS payload
+                        ON CONFLICT (kind, payload, site_path) DO UPDATE
+                        SET status = 'pending', attempts = 0, lease_owner = NULL,
+                            lease_expires_at = NULL, finished_at = NULL
+                        WHERE adidas_crawl_work.status IN ('done', 'failed')
+                    """, kind, payloads, site_path)
+            return len(payloads)
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка постановки заданий в очередь")
+            print(e)
+            return 0
+
+    async def claim_work(self, owner, kind, limit, lease_seconds, max_attempts):
+        """
+        Берёт до limit заданий вида kind в аренду. Задания с истёкшей арендой (упавший воркер)
+        выдаются повторно, пока не исчерпан max_attempts.
+        """
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    await connection.execute("""
+                        UPDATE adidas_crawl_work
+                        SET status = 'failed', lease_owner = NULL, finished_at = now()
+                        WHERE status = 'leased' AND lease_expires_at < now() AND attempts >= $1
+                    """, max_attempts)
+                    records = await connection.fetch("""
+                        UPDATE adidas_crawl_work
+                        SET status = 'leased', lease_owner = $1, attempts = attempts + 1,
+                            lease_expires_at = now() + make_interval(secs => $3)
+                        WHERE work_id IN (
+                            SELECT work_id
+                            FROM adidas_crawl_work
+                            WHERE kind = $4
+                              AND (status = 'pending' OR (status = 'leased' AND lease_expires_at < now()))
+                            ORDER BY work_id
+                            LIMIT $2
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING work_id, kind, payload, site_path
+                    """, owner, limit, float(lease_seconds), kind)
+                return [dict(record) for record in records]
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка получения заданий")
+            print(e)
+            return []
+
+    async def extend_lease(self, work_ids, owner, lease_seconds):
+        try:
+            async with self.pool.acquire() as connection:
+                await connection.execute("""
+                    UPDATE adidas_crawl_work
+                    SET lease_expires_at = now() + make_interval(secs => $3)
+                    WHERE work_id = ANY($1::bigint[]) AND lease_owner = $2 AND status = 'leased'
+                """, list(work_ids), owner, float(lease_seconds))
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка продления аренды заданий")
+            print(e)
+
+    async def complete_work(self, work_ids, owner):
+        try:
+            async with self.pool.acquire() as connection:
+                await connection.execute("""
+                    UPDATE adidas_crawl_work
+                    SET status = 'done', lease_owner = NULL, lease_expires_at = NULL, finished_at = now()
+                    WHERE work_id = ANY($1::bigint[]) AND lease_owner = $2
+                """, list(work_ids), owner)
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка завершения заданий")
+            print(e)
+
+    async def count_open_work(self):
+        try:
+            async with self.pool.acquire() as connection:
+                return await connection.fetchval(
+                    "SELECT count(*) FROM adidas_crawl_work WHERE status IN ('pending', 'leased')"
+                )
+        except asyncpg.exceptions.PostgresError as e:
+            print("Ошибка подсчёта заданий")
+            print(e)
+            return 0
+
+    async def close_connection(self):
+        await self.pool.close()
+        print("Соединение с базой данных закрыто")
+
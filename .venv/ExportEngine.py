@@ -0,0 +1,157 @@
+import os
+import csv
+import json
+import asyncio
+from datetime import datetime
+import openpyxl
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Размер порции, читаемой из серверного курсора
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+EXPORT_COLUMNS = [
+    ('product_id', 'Product ID'),
+    ('brand', 'Brand'),
+    ('category', 'Category'),
+    ('model_name', 'Model Name'),
+    ('color', 'Color'),
+    ('price', 'Price'),
+    ('discount', 'Discount'),
+    ('image_side_url', 'Image Side URL'),
+    ('image_top_url', 'Image Top URL'),
+    ('image_34_url', 'Image 3/4 URL'),
+    ('gender', 'Gender'),
+]
+
+
+class ExcelWriter:
+    def __init__(self, filename: str):
+        self.filename = filename
+        # write_only: строки сразу уходят во временный файл, а не копятся в памяти
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.sheet.append([header for _, header in EXPORT_COLUMNS])
+
+    def write(self, rows):
+        for row in rows:
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.filename)
+
+
+class CsvWriter:
+    def __init__(self, filename: str):
+        self.file = open(filename, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([header for _, header in EXPORT_COLUMNS])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter:
+    def __init__(self, filename: str):
+        self.file = open(filename, "w", encoding="utf-8")
+        self.columns = [column for column, _ in EXPORT_COLUMNS]
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False, default=str))
+            self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, filename: str):
+        if pyarrow is None:
+            raise ValueError("Для экспорта в Parquet требуется установленный пакет pyarrow")
+        self.columns = [column for column, _ in EXPORT_COLUMNS]
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in self.columns])
+        self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+
+    def write(self, rows):
+        data = {column: [row[index] for row in rows] for index, column in enumerate(self.columns)}
+        self.writer.write_table(pyarrow.Table.from_pydict(data, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+EXPORT_WRITERS = {
+    "xlsx": ExcelWriter,
+    "csv": CsvWriter,
+    "jsonl": JsonlWriter,
+    "parquet": ParquetWriter,
+}
+
+
+class ExportEngine:
+    """
+    Потоковый экспорт adidas_products: чтение порциями через серверный курсор,
+    запись в отдельном потоке, поэтому память не растёт с размером каталога,
+    а цикл событий не блокируется.
+    """
+
+    def __init__(self, pool, chunk_size: int = EXPORT_CHUNK_SIZE):
+        self.pool = pool
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def build_query(category: str = None, gender: str = None, changed_since: datetime = None):
+        conditions, args = [], []
+        if category is not None:
+            args.append(category)
+            conditions.append(f"category = ${len(args)}")
+        if gender is not None:
+            args.append(gender)
+            conditions.append(f"gender = ${len(args)}")
+        if changed_since is not None:
+            args.append(changed_since)
+            conditions.append(f"updated_at >= ${len(args)}")
+        query = f"SELECT {', '.join(column for column, _ in EXPORT_COLUMNS)} FROM adidas_products"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return query + " ORDER BY product_id", args
+
+    async def export(self, filename: str, fmt: str = None, category: str = None, gender: str = None,
+                     changed_since: datetime = None) -> int:
+        fmt = fmt or os.path.splitext(filename)[1].lstrip(".").lower()
+        if fmt not in EXPORT_WRITERS:
+            raise ValueError(f"Неизвестный формат экспорта: {fmt}, доступны: {', '.join(EXPORT_WRITERS)}")
+        query, args = self.build_query(category, gender, changed_since)
+
+        writer = await asyncio.to_thread(EXPORT_WRITERS[fmt], filename)
+        total = 0
+        pending = None
+        try:
+            async with self.pool.acquire() as connection:
+                # Серверный курсор в asyncpg работает только внутри транзакции
+                async with connection.transaction():
+                    cursor = await connection.cursor(query, *args)
+                    while True:
+                        rows = [tuple(record) for record in await cursor.fetch(self.chunk_size)]
+                        # Запись предыдущей порции идёт параллельно с чтением следующей
+                        if pending is not None:
+                            await pending
+                            pending = None
+                        if not rows:
+                            break
+                        total += len(rows)
+                        pending = asyncio.ensure_future(asyncio.to_thread(writer.write, rows))
+        finally:
+            if pending is not None:
+                await asyncio.gather(pending, return_exceptions=True)
+            await asyncio.to_thread(writer.close)
+        return total
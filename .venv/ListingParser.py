@@ -0,0 +1,120 @@
+import os
+import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+# Парсер страниц каталога: html.parser, strainer, lxml или regex
+LISTING_PARSER_BACKEND = os.getenv("LISTING_PARSER_BACKEND", "lxml" if lxml is not None else "strainer")
+# Где выполняется разбор: thread или process
+LISTING_PARSER_EXECUTOR = os.getenv("LISTING_PARSER_EXECUTOR", "thread")
+LISTING_PARSER_WORKERS = int(os.getenv("LISTING_PARSER_WORKERS", str(os.cpu_count() or 2)))
+
+PAGINATION_AUTO_ID = "pagination-pages-container"
+
+# Только карточки .grid-item: data-grid-id встречается и у других блоков (рекомендации и т. п.)
+GRID_ID_RE = re.compile(
+    r'<div\b(?=[^>]*?\bclass="[^"]*?(?<![\w-])grid-item(?![\w-]))[^>]*?\bdata-grid-id="([^"]*)"', re.IGNORECASE
+)
+PAGINATION_RE = re.compile(
+    r'<span\b[^>]*?data-auto-id="' + PAGINATION_AUTO_ID + r'"[^>]*>(.*?)</span>', re.IGNORECASE | re.DOTALL
+)
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _page_count_from_text(text: str) -> int:
+    return int(text.split("of")[1].strip())
+
+
+def _soup_builder():
+    return "lxml" if lxml is not None else "html.parser"
+
+
+# Полное дерево html.parser — исходная реализация, оставлена для сравнения
+def html_parser_product_ids(html: str) -> list:
+    soup = BeautifulSoup(html, 'html.parser')
+    return [card.get('data-grid-id') for card in soup.find_all('div', class_='grid-item')
+            if card.get('data-grid-id')]
+
+
+def html_parser_page_count(html: str) -> int:
+    soup = BeautifulSoup(html, 'html.parser')
+    span = soup.find("span", {"data-auto-id": PAGINATION_AUTO_ID})
+    return _page_count_from_text(span.get_text(strip=True))
+
+
+# SoupStrainer: в дерево попадают только карточки товаров и блок пагинации
+def strainer_product_ids(html: str) -> list:
+    soup = BeautifulSoup(html, _soup_builder(), parse_only=SoupStrainer('div', class_='grid-item'))
+    return [card.get('data-grid-id') for card in soup.find_all('div', class_='grid-item')
+            if card.get('data-grid-id')]
+
+
+def strainer_page_count(html: str) -> int:
+    soup = BeautifulSoup(html, _soup_builder(),
+                         parse_only=SoupStrainer('span', attrs={"data-auto-id": PAGINATION_AUTO_ID}))
+    span = soup.find("span")
+    return _page_count_from_text(span.get_text(strip=True))
+
+
+def lxml_product_ids(html: str) -> list:
+    tree = lxml.html.fromstring(html)
+    return [str(product_id) for product_id in
+            tree.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " grid-item ")]'
+                       '/@data-grid-id[string-length(.) > 0]')]
+
+
+def lxml_page_count(html: str) -> int:
+    tree = lxml.html.fromstring(html)
+    span = tree.xpath(f'//span[@data-auto-id="{PAGINATION_AUTO_ID}"]')[0]
+    return _page_count_from_text(span.text_content().strip())
+
+
+# Регулярные выражения без построения дерева — самый быстрый, но и самый хрупкий вариант
+def regex_product_ids(html: str) -> list:
+    return [product_id for product_id in GRID_ID_RE.findall(html) if product_id]
+
+
+def regex_page_count(html: str) -> int:
+    match = PAGINATION_RE.search(html)
+    return _page_count_from_text(TAG_RE.sub("", match.group(1)).strip())
+
+
+PARSER_BACKENDS = {
+    "html.parser": (html_parser_product_ids, html_parser_page_count),
+    "strainer": (strainer_product_ids, strainer_page_count),
+    "lxml": (lxml_product_ids, lxml_page_count),
+    "regex": (regex_product_ids, regex_page_count),
+}
+
+
+class ListingParser:
+    """Разбор страниц каталога в пуле потоков/процессов, чтобы не блокировать цикл событий."""
+
+    def __init__(self, backend: str = LISTING_PARSER_BACKEND, executor: str = LISTING_PARSER_EXECUTOR,
+                 workers: int = LISTING_PARSER_WORKERS):
+        if backend not in PARSER_BACKENDS:
+            raise ValueError(f"Неизвестный парсер: {backend}, доступны: {', '.join(PARSER_BACKENDS)}")
+        if backend == "lxml" and lxml is None:
+            raise ValueError("Для парсера lxml требуется установленный пакет lxml")
+        self.backend = backend
+        self.parse_product_ids, self.parse_page_count = PARSER_BACKENDS[backend]
+        if executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="listing-parser")
+
+    async def product_ids(self, html: str) -> list:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.parse_product_ids, html)
+
+    async def page_count(self, html: str) -> int:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.parse_page_count, html)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,148 @@
+"""
+Локальная замена adidas.com для бенчмарков: страницы каталога и JSON товаров
+с настраиваемой задержкой и долей ответов 403.
+
+Запуск отдельно:
+    python MockAdidasServer.py --port 8080 --products 2000 --latency 0.05 --forbidden-rate 0.02
+"""
+
+import random
+import asyncio
+import hashlib
+import argparse
+from aiohttp import web
+
+
+PRODUCTS_PER_PAGE = 48
+
+
+def product_id_for(index: int) -> str:
+    return f"{chr(65 + index // 10000 % 26)}{chr(65 + index // 260000 % 26)}{index % 10000:04d}"
+
+
+def render_listing_page(product_ids: list, page: int, total_pages: int) -> str:
+    cards = "".join(f'''
+      <div class="grid-item" data-grid-id="{product_id}" data-index="{index}">
+        <div class="glass-product-card-container" data-auto-id="glass-product-card">
+          <a href="/us/product/{product_id}.html" data-auto-id="glass-hockeycard-link">
+            <img src="https://assets.adidas.com/images/{product_id}_01_standard.jpg" alt="{product_id}">
+          </a>
+          <p class="glass-product-card__title" data-auto-id="product-card-title">Product {product_id}</p>
+        </div>
+      </div>''' for index, product_id in enumerate(product_ids))
+    return f'''<!DOCTYPE html>
+<html lang="en-US">
+  <head><meta charset="utf-8"><title>adidas US</title></head>
+  <body>
+    <div class="product-container" data-auto-id="product_container">{cards}
+    </div>
+    <span class="gl-body gl-body--s gl-no-margin-bottom" data-auto-id="pagination-pages-container">Page {page} of <!-- -->{total_pages}</span>
+  </body>
+</html>
+'''
+
+
+def product_json(product_id: str, index: int) -> dict:
+    price = 40 + index % 15 * 10
+    data = {
+        "id": product_id,
+        "brand": "adidas",
+        "category": "Shoes" if index % 3 else "Clothing",
+        "name": f"Product {product_id}",
+        "color": random.Random(index).choice(["Black", "White", "Core Black / Cloud White", "Blue"]),
+        "price": price,
+        "gender": random.Random(index).choice(["M", "W", "U"]),
+        "images": [
+            {"src": f"https://assets.adidas.com/images/{product_id}_0{order}_standard.jpg",
+             "metadata": {"sortOrder": str(order)}}
+            for order in range(1, 6)
+        ],
+    }
+    if index % 4 == 0:
+        data["salePrice"] = round(price * 0.7, 2)
+    return data
+
+
+class MockAdidasServer:
+    def __init__(self, products: int = 1000, latency: float = 0.0, jitter: float = 0.0,
+                 forbidden_rate: float = 0.0, seed: int = None):
+        self.products = products
+        self.latency = latency
+        self.jitter = jitter
+        self.forbidden_rate = forbidden_rate
+        self.random = random.Random(seed)
+        self.index = {product_id_for(index): index for index in range(products)}
+        self.requests = 0
+        self.forbidden = 0
+        self.runner = None
+        self.base_url = None
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, -(-self.products // PRODUCTS_PER_PAGE))
+
+    async def _simulate(self):
+        self.requests += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.random.random() < self.forbidden_rate:
+            self.forbidden += 1
+            raise web.HTTPForbidden()
+
+    async def listing(self, request: web.Request):
+        await self._simulate()
+        start = int(request.query.get("start", 0))
+        end = min(self.products, start + PRODUCTS_PER_PAGE)
+        product_ids = [product_id_for(index) for index in range(start, end)]
+        html = render_listing_page(product_ids, start // PRODUCTS_PER_PAGE + 1, self.total_pages)
+        return web.Response(text=html, content_type="text/html")
+
+    async def product(self, request: web.Request):
+        await self._simulate()
+        product_id = request.match_info["product_id"]
+        if product_id not in self.index:
+            raise web.HTTPNotFound()
+        data = product_json(product_id, self.index[product_id])
+        etag = '"' + hashlib.sha1(repr(sorted(data.items())).encode()).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(data, headers={"ETag": etag})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/search/product/{product_id}", self.product)
+        app.router.add_get("/{site_path}/{category}", self.listing)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.runner = web.AppRunner(self.make_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена adidas.com")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--forbidden-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockAdidasServer(args.products, args.latency, args.jitter, args.forbidden_rate)
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
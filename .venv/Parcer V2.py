@@ -0,0 +1,323 @@
+"""
+Version 3: Refactored for OOP standards and added asynchronous functionality.
+
+This version of the code introduces a more organized structure using object-oriented programming (OOP) principles
+and leverages asynchronous programming for improved performance.
+
+Changes Made:
+- Refactored the code to use classes for DatabaseManager and AdidasScraper.
+- Introduced asynchronous functionality using asyncio and aiohttp.
+- Added type hints for better code readability and maintainability.
+"""
+
+
+import asyncpg
+import os
+import time
+import itertools
+import asyncio
+import aiohttp
+from datetime import datetime, timezone
+import openpyxl
+import psycopg2
+from fake_useragent import UserAgent
+from dotenv import load_dotenv
+from DatabaseManager import AsyncDatabaseManager
+from RequestScheduler import RequestScheduler
+from ListingParser import ListingParser
+from CrawlPipeline import CrawlPipeline, NOT_MODIFIED
+from CrawlMetrics import metrics
+from ShardedCrawl import SHARD_WORKERS, enqueue_category, enqueue_backfill, run_workers
+
+
+load_dotenv("parcer.env")
+
+# Получение значений переменных среды
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_NAME = os.getenv("DB_NAME")
+
+# Параметры пула HTTP-соединений
+SCRAPER_CONNECTION_LIMIT = int(os.getenv("SCRAPER_CONNECTION_LIMIT", "100"))
+SCRAPER_CONNECTION_LIMIT_PER_HOST = int(os.getenv("SCRAPER_CONNECTION_LIMIT_PER_HOST", "16"))
+SCRAPER_DNS_CACHE_TTL = int(os.getenv("SCRAPER_DNS_CACHE_TTL", "300"))
+SCRAPER_KEEPALIVE_TIMEOUT = float(os.getenv("SCRAPER_KEEPALIVE_TIMEOUT", "30"))
+SCRAPER_REQUEST_TIMEOUT = float(os.getenv("SCRAPER_REQUEST_TIMEOUT", "30"))
+# Адрес API товаров и регион (sitePath)
+ADIDAS_API_BASE = os.getenv("ADIDAS_API_BASE", "https://www.adidas.com")
+ADIDAS_SITE_PATH = os.getenv("ADIDAS_SITE_PATH", "us")
+# HTTP-прокси через запятую, используются по кругу
+SCRAPER_PROXIES = [proxy.strip() for proxy in os.getenv("SCRAPER_PROXIES", "").split(",") if proxy.strip()]
+
+
+class AdidasScraper:
+    def __init__(self, scheduler: RequestScheduler = None, proxies: list = None, parser: ListingParser = None,
+                 api_base: str = ADIDAS_API_BASE, site_path: str = ADIDAS_SITE_PATH):
+        self.ua = UserAgent()
+        self.api_base = api_base.rstrip("/")
+        self.site_path = site_path
+        self.scheduler = scheduler or RequestScheduler()
+        self.parser = parser or ListingParser()
+        self.proxies = itertools.cycle(proxies) if proxies else None
+        self.session = None
+
+    async def start(self):
+        # Одна долгоживущая сессия с общим пулом соединений на весь обход
+        connector = aiohttp.TCPConnector(
+            limit=SCRAPER_CONNECTION_LIMIT,
+            limit_per_host=SCRAPER_CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=SCRAPER_DNS_CACHE_TTL,
+            keepalive_timeout=SCRAPER_KEEPALIVE_TIMEOUT,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=SCRAPER_REQUEST_TIMEOUT),
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self.parser.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def next_proxy(self):
+        return next(self.proxies) if self.proxies else None
+
+    async def fetch(self, url: str, retry_count: int = 2):
+        headers = {
+            "User-Agent": self.ua.random,
+            "Accept-Language": "en-US,en;q=0.9",
+            "Accept-Encoding": "gzip, deflate, br",
+            "Connection": "keep-alive",
+            "Upgrade-Insecure-Requests": "1",
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "none",
+            "Sec-Fetch-User": "?1",
+            "Referer": "https://www.adidas.com/us",
+            "DNT": "1",
+            "TE": "Trailers",
+        }
+
+        for attempt in range(retry_count):
+            started = time.perf_counter()
+            try:
+                async with self.scheduler.slot(url):
+                    metrics.observe("scheduler_wait", time.perf_counter() - started)
+                    started = time.perf_counter()
+                    async with self.session.get(url, headers=headers, proxy=self.next_proxy()) as response:
+                        self.scheduler.record(url, response.status)
+                        metrics.record_request("listing", response.status, time.perf_counter() - started)
+                        if response.status == 200:
+                            return await response.text()
+                        elif response.status in RequestScheduler.BLOCK_STATUSES:
+                            print(f"{response.status} для {url}, повторная попытка...")
+                        else:
+                            print(f"Неудачный запрос для {url}, статус: {response.status}")
+                            return None
+            except aiohttp.ClientResponseError as e:
+                print(f"Ошибка клиентского ответа: {e}, повторная попытка...")
+            except Exception as e:
+                self.scheduler.record(url, None)
+                metrics.record_request("listing", None, time.perf_counter() - started)
+                print(f"Исключение: {e}, повторная попытка...")
+            if attempt + 1 < retry_count:
+                metrics.incr("retries_total")
+                await self.scheduler.backoff(attempt)
+
+        metrics.incr("failed_requests_total")
+        print(f"Не удалось выполнить запрос для {url} после {retry_count} попыток")
+        return None
+
+    async def pages(self, url: str):
+        html = await self.fetch(url)
+        with metrics.timer("listing_parse"):
+            return await self.parser.page_count(html)
+
+    async def scrape_product_ids(self, url: str):
+        html = await self.fetch(url)
+        if html is None:
+            print(f"Пустой HTML-код для URL: {url}")
+            # Отправляем повторный запрос в случае пустого HTML-кода
+            print(f"Повторный запрос для URL: {url}")
+            html = await self.fetch(url)
+            if html is None:
+                print(f"Повторный запрос не вернул данные для URL: {url}")
+                return {}
+
+        with metrics.timer("listing_parse"):
+            product_ids = await self.parser.product_ids(html)
+        metrics.incr("listing_pages_total")
+
+        products = {}
+        for product_id in product_ids:
+            products[product_id] = {
+                'brand': None,
+                'category': None,
+                'model_name': None,
+                'color': None,
+                'price': None,
+                'discount': None,
+                'product_id': product_id,
+                'image_side_url': None,
+                'image_top_url': None,
+                'image_34_url': None,
+                'gender': None
+            }
+        return products
+
+    async def fetch_adidas_data_conditional(self, product_id: str, state: dict = None, retry_count: int = 2):
+        """
+        Условный запрос JSON товара по сохранённым ETag/Last-Modified.
+        Возвращает (data, validators), где data — JSON, NOT_MODIFIED (ответ 304) или None.
+        """
+        url = f"{self.api_base}/api/search/product/{product_id}?sitePath={self.site_path}"
+        headers = {
+            "User-Agent": self.ua.random,
+            "Accept": "application/json",
+        }
+        if state:
+            if state.get('etag'):
+                headers["If-None-Match"] = state['etag']
+            if state.get('last_modified'):
+                headers["If-Modified-Since"] = state['last_modified']
+
+        for attempt in range(retry_count):
+            started = time.perf_counter()
+            try:
+                async with self.scheduler.slot(url):
+                    metrics.observe("scheduler_wait", time.perf_counter() - started)
+                    started = time.perf_counter()
+                    async with self.session.get(url, headers=headers, proxy=self.next_proxy()) as response:
+                        self.scheduler.record(url, response.status)
+                        metrics.record_request("product", response.status, time.perf_counter() - started)
+                        validators = {
+                            'etag': response.headers.get("ETag"),
+                            'last_modified': response.headers.get("Last-Modified"),
+                        }
+                        if response.status == 200:
+                            return await response.json(), validators
+                        elif response.status == 304:
+                            return NOT_MODIFIED, validators
+                        elif response.status in RequestScheduler.BLOCK_STATUSES:
+                            print(f"{response.status} for {url}, retrying...")
+                        else:
+                            response.raise_for_status()
+            except aiohttp.ClientResponseError as e:
+                print(f"ClientResponseError: {e}, retrying...")
+            except Exception as e:
+                self.scheduler.record(url, None)
+                metrics.record_request("product", None, time.perf_counter() - started)
+                print(f"Exception: {e}, retrying...")
+            if attempt + 1 < retry_count:
+                metrics.incr("retries_total")
+                await self.scheduler.backoff(attempt)
+
+        metrics.incr("failed_requests_total")
+        print(f"Failed to fetch Adidas data for {product_id} after {retry_count} attempts")
+        return None, {}
+
+    async def parse_adidas_json(self, json_data):
+        with metrics.timer("json_parse"):
+            return self._parse_adidas_json(json_data)
+
+    @staticmethod
+    def _parse_adidas_json(json_data):
+        # Инициализируем переменную для URL изображения
+        image_side_url, image_top_url, image_34_url = None, None, None
+
+        for image in json_data.get("images", []):
+            sort_order = image.get("metadata", {}).get("sortOrder")
+            if sort_order == '1':
+                image_side_url = image.get("src")
+            elif sort_order == '2':
+                image_top_url = image.get("src")
+            elif sort_order == '4':
+                image_34_url = image.get("src")
+
+        product_info = {
+            "brand": json_data["brand"],
+            "category": json_data["category"],
+            "product_id": json_data["id"],
+            "model_name": json_data["name"],
+            "color": json_data["color"],
+            "price": json_data["price"],
+            "discount": json_data.get("salePrice", ""),
+            "image_side_url": image_side_url,
+            "image_top_url": image_top_url,
+            "image_34_url": image_34_url,
+            "gender": json_data.get("gender", "")
+        }
+        return product_info
+
+
+async def main():
+    db_manager = AsyncDatabaseManager()
+    await db_manager.connect_to_database()
+    await db_manager.create_table()
+
+    print("Выберите действие:")
+    print("1: Произвести парсинг по заданному URL")
+    print("2: Произвести парсинг по product_id без brand")
+    print("3: Получить Excel файл с базой")
+    print("4: Распределённый парсинг в несколько процессов (один sitePath за раз)")
+    print("5: Подключиться воркерами к существующей очереди заданий")
+    choice = input("Введите номер действия: ")
+
+    scraper = AdidasScraper(proxies=SCRAPER_PROXIES)
+    await scraper.start()
+    pipeline = CrawlPipeline(scraper, db_manager)
+
+    try:
+        if choice == "1":
+            url = input("Введите URL: ")
+            await pipeline.run_category(url)
+
+            await db_manager.export_to_excel('adidas_products_final.xlsx')
+        elif choice == "2":
+            product_ids = await db_manager.get_products_without_brand()
+            await pipeline.run_products(product_ids)
+        elif choice == "3":
+            fmt = input("Формат (xlsx/csv/jsonl/parquet) [xlsx]: ").strip() or "xlsx"
+            category = input("Категория (пусто — все): ").strip() or None
+            gender = input("Пол (пусто — все): ").strip() or None
+            changed_since = input("Изменённые с даты YYYY-MM-DD (пусто — все): ").strip()
+            changed_since = datetime.fromisoformat(changed_since).replace(tzinfo=timezone.utc) if changed_since else None
+            await db_manager.export(f'adidas_products_final.{fmt}', fmt, category=category, gender=gender,
+                                    changed_since=changed_since)
+        elif choice in ("4", "5"):
+            workers = int(input(f"Число процессов [{SHARD_WORKERS}]: ").strip() or SHARD_WORKERS)
+            if choice == "4":
+                urls = [url.strip() for url in input("URL через запятую: ").split(",") if url.strip()]
+                # Товары хранятся по product_id без региона, поэтому несколько регионов
+                # одновременно не обходятся: очередь принимает только один sitePath
+                site_path = input(f"sitePath, один регион; другой можно обойти после завершения очереди "
+                                  f"[{ADIDAS_SITE_PATH}]: ").strip() or ADIDAS_SITE_PATH
+                backfill = input("Добавить товары без brand? (y/n): ").strip().lower() == "y"
+                enqueued = 0
+                for url in urls:
+                    enqueued += await enqueue_category(db_manager, scraper, url, site_path)
+                if backfill:
+                    enqueued += await enqueue_backfill(db_manager, site_path)
+                if not enqueued:
+                    print("Новых заданий нет, воркеры не запускаются")
+                    return
+            await asyncio.to_thread(run_workers, AdidasScraper, workers, SCRAPER_PROXIES)
+        else:
+            print("Некорректный выбор действия")
+    finally:
+        await scraper.close()
+        await db_manager.close_connection()
+        metrics.report()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+
+# Параметры планировщика запросов
+SCRAPER_RATE = float(os.getenv("SCRAPER_RATE", "2"))
+SCRAPER_MIN_RATE = float(os.getenv("SCRAPER_MIN_RATE", "0.2"))
+SCRAPER_MAX_RATE = float(os.getenv("SCRAPER_MAX_RATE", "20"))
+SCRAPER_MAX_IN_FLIGHT = int(os.getenv("SCRAPER_MAX_IN_FLIGHT", "16"))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # Под замком, чтобы ожидающие запросы получали токены по очереди
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostState:
+    def __init__(self, rate: float, window: int):
+        self.bucket = TokenBucket(rate)
+        self.statuses = deque(maxlen=window)
+        # Ответов, учтённых после последнего снижения скорости
+        self.fresh_samples = 0
+        self.clean_streak = 0
+
+
+class RequestScheduler:
+    """
+    Общий планировщик запросов: token bucket на каждый хост, семафор на число
+    одновременных запросов и адаптивная скорость (снижается при росте доли 403/429 и сетевых ошибок,
+    плавно растёт, пока ответы чистые).
+    """
+
+    BLOCK_STATUSES = (403, 429)
+
+    def __init__(self, rate: float = SCRAPER_RATE, max_in_flight: int = SCRAPER_MAX_IN_FLIGHT,
+                 min_rate: float = SCRAPER_MIN_RATE, max_rate: float = SCRAPER_MAX_RATE,
+                 window: int = 50, block_threshold: float = 0.1, clean_streak_to_speed_up: int = 20,
+                 speed_up_step: float = 0.25, slow_down_factor: float = 0.5, cooldown: float = 5.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.window = window
+        self.block_threshold = block_threshold
+        self.clean_streak_to_speed_up = clean_streak_to_speed_up
+        self.speed_up_step = speed_up_step
+        self.slow_down_factor = slow_down_factor
+        self.cooldown = cooldown
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.hosts = {}
+
+    def _host(self, url: str) -> HostState:
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.rate, self.window)
+        return self.hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        # Сначала место среди одновременных запросов, потом токен: иначе запросы,
+        # ждущие семафор, заранее тратят токены и уходят пачкой
+        async with self.semaphore:
+            await self._host(url).bucket.acquire()
+            yield
+
+    def record(self, url: str, status):
+        """
+        Учитывает результат запроса (HTTP-статус или None при сетевой ошибке).
+        Сетевые ошибки и таймауты считаются как блокировки: так часто выглядит троттлинг.
+        Доля блокировок оценивается только по полному окну из window ответов, набранных после
+        предыдущего снижения скорости. Блокировки, пришедшие во время паузы cooldown, — ответы
+        на запросы, отправленные ещё на прежней скорости, и не учитываются.
+        """
+        state = self._host(url)
+        bucket = state.bucket
+        blocked = status is None or status in self.BLOCK_STATUSES
+
+        if blocked:
+            state.clean_streak = 0
+            if time.monotonic() < bucket.blocked_until:
+                return
+            state.statuses.append(True)
+            state.fresh_samples += 1
+            if state.fresh_samples < self.window:
+                return
+            block_rate = sum(state.statuses) / len(state.statuses)
+            if block_rate >= self.block_threshold:
+                new_rate = max(self.min_rate, bucket.rate * self.slow_down_factor)
+                if new_rate < bucket.rate:
+                    print(f"Доля блокировок и сетевых ошибок для {urlparse(url).netloc} {block_rate:.0%}, "
+                          f"снижаем скорость до {new_rate:.2f} запр/с")
+                bucket.rate = new_rate
+                bucket.blocked_until = time.monotonic() + self.cooldown
+                state.fresh_samples = 0
+        else:
+            state.statuses.append(False)
+            state.fresh_samples += 1
+            state.clean_streak += 1
+            if state.clean_streak >= self.clean_streak_to_speed_up and bucket.rate < self.max_rate:
+                bucket.rate = min(self.max_rate, bucket.rate + self.speed_up_step)
+                state.clean_streak = 0
+
+    @staticmethod
+    async def backoff(attempt: int, base: float = 1.0, cap: float = 30.0):
+        # Экспоненциальная задержка с джиттером перед повторной попыткой
+        await asyncio.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
@@ -0,0 +1,134 @@
+import os
+import sys
+import socket
+import asyncio
+import multiprocessing
+from itertools import groupby
+from DatabaseManager import AsyncDatabaseManager, empty_product
+from RequestScheduler import RequestScheduler, SCRAPER_RATE, SCRAPER_MAX_RATE
+from CrawlPipeline import CrawlPipeline
+from CrawlMetrics import metrics, METRICS_JSON_PATH, METRICS_PROMETHEUS_PATH
+
+
+# Параметры распределённого обхода
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", str(os.cpu_count() or 2)))
+# Страница каталога даёт до 48 товаров, поэтому страницы выдаются по несколько штук,
+# чтобы категория расходилась по всем воркерам; товары (досбор brand) — крупными пачками
+SHARD_PAGE_BATCH_SIZE = int(os.getenv("SHARD_PAGE_BATCH_SIZE", "2"))
+SHARD_BATCH_SIZE = int(os.getenv("SHARD_BATCH_SIZE", "200"))
+SHARD_LEASE_SECONDS = float(os.getenv("SHARD_LEASE_SECONDS", "300"))
+SHARD_MAX_ATTEMPTS = int(os.getenv("SHARD_MAX_ATTEMPTS", "3"))
+SHARD_POLL_INTERVAL = float(os.getenv("SHARD_POLL_INTERVAL", "5"))
+# Соединений с базой на процесс: запись пакетов, аренда заданий и чтение состояния загрузки.
+# Пул по умолчанию (10) на каждый из SHARD_WORKERS процессов быстро исчерпывает max_connections
+SHARD_DB_POOL_SIZE = int(os.getenv("SHARD_DB_POOL_SIZE", "4"))
+
+PAGE_WORK = "page"
+PRODUCT_WORK = "product"
+
+
+async def enqueue_category(db_manager: AsyncDatabaseManager, scraper, base_url: str, site_path: str) -> int:
+    num_pages = await scraper.pages(base_url)
+    urls = [base_url] + [f"{base_url}?start={i * 48}" for i in range(1, num_pages)]
+    count = await db_manager.enqueue_work(PAGE_WORK, urls, site_path)
+    print(f"{base_url}: в очередь поставлено {count} страниц")
+    return count
+
+
+async def enqueue_backfill(db_manager: AsyncDatabaseManager, site_path: str) -> int:
+    products = await db_manager.get_products_without_brand()
+    count = await db_manager.enqueue_work(PRODUCT_WORK, products.keys(), site_path)
+    print(f"В очередь поставлено {count} товаров без brand")
+    return count
+
+
+async def _keep_leases(db_manager: AsyncDatabaseManager, work_ids: list, owner: str, lease_seconds: float):
+    # Продлеваем аренду, пока задания обрабатываются
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        await db_manager.extend_lease(work_ids, owner, lease_seconds)
+
+
+async def run_worker(owner: str, scraper_class, rate_share: float = 1.0, proxies: list = None,
+                     page_batch_size: int = SHARD_PAGE_BATCH_SIZE, batch_size: int = SHARD_BATCH_SIZE,
+                     lease_seconds: float = SHARD_LEASE_SECONDS,
+                     max_attempts: int = SHARD_MAX_ATTEMPTS, poll_interval: float = SHARD_POLL_INTERVAL):
+    """
+    Цикл воркера: берёт задания из adidas_crawl_work (FOR UPDATE SKIP LOCKED), прогоняет их
+    через свой CrawlPipeline и отмечает выполненными. Завершается, когда открытых заданий не осталось.
+    Возвращает False, если не удалось подключиться к базе.
+    """
+    db_manager = AsyncDatabaseManager()
+    await db_manager.connect_to_database(min_size=1, max_size=SHARD_DB_POOL_SIZE)
+    if db_manager.pool is None:
+        print(f"[{owner}] нет соединения с базой, воркер остановлен")
+        return False
+    scheduler = RequestScheduler(rate=SCRAPER_RATE * rate_share, max_rate=SCRAPER_MAX_RATE * rate_share)
+    scraper = scraper_class(scheduler=scheduler, proxies=proxies)
+    await scraper.start()
+    pipeline = CrawlPipeline(scraper, db_manager)
+
+    try:
+        while True:
+            items = await db_manager.claim_work(owner, PAGE_WORK, page_batch_size, lease_seconds, max_attempts)
+            if not items:
+                items = await db_manager.claim_work(owner, PRODUCT_WORK, batch_size, lease_seconds, max_attempts)
+            if not items:
+                if not await db_manager.count_open_work():
+                    break
+                # Остальные задания в аренде у других воркеров — ждём, вдруг аренда истечёт
+                await asyncio.sleep(poll_interval)
+                continue
+
+            work_ids = [item['work_id'] for item in items]
+            heartbeat = asyncio.create_task(_keep_leases(db_manager, work_ids, owner, lease_seconds))
+            try:
+                items.sort(key=lambda item: (item['site_path'], item['kind']))
+                for (site_path, kind), group in groupby(items, key=lambda item: (item['site_path'], item['kind'])):
+                    payloads = [item['payload'] for item in group]
+                    scraper.site_path = site_path
+                    if kind == PAGE_WORK:
+                        await pipeline.run(urls=payloads)
+                    else:
+                        await pipeline.run(products=[empty_product(product_id) for product_id in payloads])
+            finally:
+                heartbeat.cancel()
+            await db_manager.complete_work(work_ids, owner)
+    finally:
+        await scraper.close()
+        await db_manager.close_connection()
+        print(f"[{owner}] итоги воркера:")
+        metrics.report(f"{METRICS_JSON_PATH}.{owner}" if METRICS_JSON_PATH else "",
+                       f"{METRICS_PROMETHEUS_PATH}.{owner}" if METRICS_PROMETHEUS_PATH else "")
+    return True
+
+
+def worker_process(owner: str, scraper_class, rate_share: float, proxies: list):
+    if not asyncio.run(run_worker(owner, scraper_class, rate_share, proxies)):
+        sys.exit(1)
+
+
+def run_workers(scraper_class, workers: int = SHARD_WORKERS, proxies: list = None):
+    """
+    Запускает workers процессов, у каждого свой цикл событий и пул соединений с базой.
+    Лимит скорости делится между процессами поровну. Каждый процесс получает весь список
+    proxies, но начинает обход по кругу со своего прокси.
+    """
+    proxies = proxies or []
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    # spawn: дочерние процессы не наследуют соединения и цикл событий родителя
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=worker_process, args=(
+            f"{prefix}-{index}", scraper_class, 1 / workers,
+            proxies[index % len(proxies):] + proxies[:index % len(proxies)] if proxies else None
+        ))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    failed = [process for process in processes if process.exitcode != 0]
+    if failed:
+        print(f"Воркеров завершилось с ошибкой: {len(failed)}, их задания будут выданы повторно после истечения аренды")
@@ -0,0 +1,116 @@
+"""
+Сквозной бенчмарк обхода: AdidasScraper + CrawlPipeline против локального MockAdidasServer.
+
+Использование:
+    python benchmark_crawl.py --products 2000 --latency 0.05 --forbidden-rate 0.02 --detail-workers 32
+
+По умолчанию записи складываются в память; с --database используется настоящая база из parcer.env.
+"""
+
+import os
+import asyncio
+import argparse
+import importlib.util
+from datetime import datetime, timezone
+from MockAdidasServer import MockAdidasServer
+from RequestScheduler import RequestScheduler
+from CrawlPipeline import CrawlPipeline
+from CrawlMetrics import metrics
+
+
+def load_scraper_class():
+    # Основной модуль называется "Parcer V2.py", поэтому обычный import не подходит
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Parcer V2.py")
+    spec = importlib.util.spec_from_file_location("parcer_v2", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.AdidasScraper
+
+
+class MemoryDatabase:
+    """Хранилище в памяти с интерфейсом AsyncDatabaseManager, нужным конвейеру."""
+
+    def __init__(self):
+        self.products = {}
+        self.fetch_state = {}
+
+    async def insert_data(self, data, batch_size: int = None, fetch_states: dict = None):
+        inserted, updated = 0, 0
+        with metrics.timer("db_write"):
+            for item in data:
+                if item['product_id'] in self.products:
+                    updated += 1
+                else:
+                    inserted += 1
+                self.products[item['product_id']] = dict(item)
+            await self.save_fetch_state(fetch_states.values() if fetch_states else ())
+        metrics.incr("rows_inserted_total", inserted)
+        metrics.incr("rows_updated_total", updated)
+        return inserted, updated
+
+    async def get_fetch_state(self, keys):
+        return {key: self.fetch_state[key] for key in keys if key in self.fetch_state}
+
+    async def save_fetch_state(self, states):
+        now = datetime.now(timezone.utc)
+        for state in states:
+            current = self.fetch_state.get(state['key'], {})
+            updates = {name: value for name, value in state.items() if value is not None}
+            self.fetch_state[state['key']] = {**current, **updates, 'fetched_at': now}
+
+
+async def run(args):
+    server = MockAdidasServer(args.products, args.latency, args.jitter, args.forbidden_rate, seed=args.seed)
+    base_url = await server.start()
+
+    if args.database:
+        from DatabaseManager import AsyncDatabaseManager
+        db_manager = AsyncDatabaseManager()
+        await db_manager.connect_to_database()
+        await db_manager.create_table()
+    else:
+        db_manager = MemoryDatabase()
+
+    scheduler = RequestScheduler(rate=args.rate, max_rate=args.max_rate, max_in_flight=args.max_in_flight)
+    scraper = load_scraper_class()(scheduler=scheduler, api_base=base_url)
+    await scraper.start()
+    pipeline = CrawlPipeline(scraper, db_manager, listing_workers=args.listing_workers,
+                             detail_workers=args.detail_workers, incremental=not args.full)
+    try:
+        for run_number in range(1, args.runs + 1):
+            metrics.reset()
+            print(f"Прогон {run_number}: {args.products} товаров, {server.total_pages} страниц")
+            await pipeline.run_category(f"{base_url}/us/{args.category}")
+            metrics.report(args.json.format(run=run_number) if args.json else "",
+                           args.prometheus.format(run=run_number) if args.prometheus else "")
+    finally:
+        await scraper.close()
+        if args.database:
+            await db_manager.close_connection()
+        await server.stop()
+    print(f"Сервер обработал {server.requests} запросов, из них 403: {server.forbidden}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обхода на локальном стенде")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--category", default="men-shoes")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа стенда, с")
+    parser.add_argument("--jitter", type=float, default=0.02, help="случайная добавка к задержке, с")
+    parser.add_argument("--forbidden-rate", type=float, default=0.0, help="доля ответов 403")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=200, help="начальная скорость, запр/с")
+    parser.add_argument("--max-rate", type=float, default=1000)
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--listing-workers", type=int, default=4)
+    parser.add_argument("--detail-workers", type=int, default=32)
+    parser.add_argument("--runs", type=int, default=1, help="повторные прогоны проверяют инкрементальный режим")
+    parser.add_argument("--full", action="store_true", help="отключить инкрементальный режим")
+    parser.add_argument("--database", action="store_true", help="писать в настоящую базу")
+    parser.add_argument("--json", default="", help="файл для метрик в JSON, допускается {run}")
+    parser.add_argument("--prometheus", default="", help="файл для метрик в формате Prometheus")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
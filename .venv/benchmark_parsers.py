@@ -0,0 +1,61 @@
+"""
+Микробенчмарк парсеров страниц каталога.
+
+Использование:
+    python benchmark_parsers.py [страница.html ...] [--repeat N]
+
+По умолчанию берутся все файлы fixtures/*.html рядом со скриптом. Входящая в репозиторий
+fixtures/listing_page.html синтетическая: она проверяет, что парсеры находят одни и те же товары,
+но время разбора на ней не переносится на настоящие страницы — меряйте на сохранённых с сайта.
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+from ListingParser import PARSER_BACKENDS, lxml
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def bench(func, html: str, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(html)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение парсеров страниц каталога")
+    parser.add_argument("pages", nargs="*", help="HTML-файлы страниц каталога")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = args.pages or sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+    if not paths:
+        print("Нет страниц для сравнения: передайте файлы или положите их в fixtures/")
+        sys.exit(1)
+
+    backends = {name: funcs for name, funcs in PARSER_BACKENDS.items() if name != "lxml" or lxml is not None}
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            html = file.read()
+        print(f"{path} ({len(html) / 1024:.0f} КБ)")
+
+        reference_ids, reference_pages = None, None
+        for name, (product_ids, page_count) in backends.items():
+            ids, pages = product_ids(html), page_count(html)
+            if reference_ids is None:
+                reference_ids, reference_pages = ids, pages
+            status = "ok" if (ids, pages) == (reference_ids, reference_pages) else "РАСХОЖДЕНИЕ"
+
+            ids_ms = bench(product_ids, html, args.repeat)
+            pages_ms = bench(page_count, html, args.repeat)
+            print(f"  {name:12} product_ids {ids_ms:8.2f} мс  page_count {pages_ms:8.2f} мс  "
+                  f"[{len(ids)} товаров, {pages} стр., {status}]")
+
+
+if __name__ == "__main__":
+    main()